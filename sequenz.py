@@ -1,30 +1,123 @@
+import os
 import RPi.GPIO as GPIO
 import serial
+import threading
 import time
 import pygame
 
 sound_file = 'sound.flac'
 control_pin = 17
 dmx_address = 1
-serial_port = '/dev/ttyS0'
+# serial0 points at the primary UART. DMX needs 8N2 at a stable 250 kbaud,
+# which only the PL011 provides; on boards with Bluetooth the mini-UART is
+# primary (1 stop bit, baud follows the core clock) unless config.txt has
+# dtoverlay=disable-bt or dtoverlay=miniuart-bt
+serial_port = '/dev/serial0'
 baud_rate = 250000
+dmx_refresh_interval = 1 / 40
+dmx_break_time = 100e-6
+dmx_thread_priority = 80
+sound_end_event = pygame.USEREVENT + 1
 
-pygame.mixer.init()
-pygame.mixer.music.load(sound_file)
+ser = None
+dmx_frame = bytearray(513)
+blackout_frame = bytes(513)
+full_on_frame = b'\x00' + b'\xff' * 512
+dmx_lock = threading.Lock()
+dmx_stop = threading.Event()
+dmx_thread = None
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(control_pin, GPIO.OUT)
+def init_hardware():
+    global ser, dmx_thread
 
-ser = serial.Serial(serial_port, baud_rate)
+    # the event queue needs the video subsystem, even when running headless
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
 
+    pygame.mixer.init()
+    pygame.mixer.music.load(sound_file)
+    pygame.mixer.music.set_endevent(sound_end_event)
+
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(control_pin, GPIO.OUT)
+
+    ser = serial.Serial(serial_port, baud_rate, stopbits=serial.STOPBITS_TWO)
+
+    dmx_thread = threading.Thread(target=dmx_refresh_loop, daemon=True)
+    dmx_thread.start()
+
+def shutdown_hardware():
+    try:
+        blackout()
+        # a dead refresh thread means the port already failed; skip the frame
+        if dmx_thread is not None and dmx_thread.is_alive():
+            dmx_stop.set()
+            dmx_thread.join()
+            send_dmx_frame()
+    finally:
+        GPIO.cleanup()
+        if ser is not None:
+            ser.close()
+        pygame.quit()
+
+def send_dmx_frame():
+    ser.break_condition = True
+    time.sleep(dmx_break_time)
+    ser.break_condition = False
+    ser.write(bytes(dmx_frame))
+    ser.flush()
+
+def dmx_refresh_loop():
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(dmx_thread_priority))
+    except PermissionError:
+        pass
+
+    next_frame = time.monotonic()
+    while not dmx_stop.wait(max(0, next_frame - time.monotonic())):
+        next_frame = time.monotonic() + dmx_refresh_interval
+        send_dmx_frame()
+
+def check_dmx_thread():
+    # the thread only ends on its own if sending failed (its traceback is
+    # already on stderr); carrying on would play without any DMX output
+    if dmx_thread is not None and not dmx_thread.is_alive():
+        raise RuntimeError('DMX refresh thread stopped')
+
+def check_dmx_address(address):
+    # slot 0 holds the start code; negative indices would wrap around
+    if not 1 <= address <= 512:
+        raise ValueError(f'DMX address out of range: {address}')
+
+# writers hold dmx_lock so concurrent updates are never lost; the refresh
+# thread needs no lock, as every publish is a single store or slice assignment
 def send_dmx(address, value):
-    ser.write(b'\x00' * (address - 1))
-    ser.write(bytes([value]))
-    ser.write(b'\x00' * (512 - address))
+    check_dmx_address(address)
+    with dmx_lock:
+        dmx_frame[address] = value
+
+def send_dmx_batch(updates):
+    # build the batch in a copy and publish it with a single slice
+    # assignment, so the refresh thread never snapshots a half-applied batch
+    with dmx_lock:
+        new_frame = bytearray(dmx_frame)
+        for address, value in updates.items():
+            check_dmx_address(address)
+            new_frame[address] = value
+        dmx_frame[:] = new_frame
+
+def blackout():
+    with dmx_lock:
+        dmx_frame[:] = blackout_frame
+
+def full_on():
+    with dmx_lock:
+        dmx_frame[:] = full_on_frame
     
 def main_loop():
     try:
         while True:
+            check_dmx_thread()
             pygame.mixer.music.play()
             GPIO.output(control_pin, True)
             send_dmx(dmx_address, 255)
@@ -34,15 +127,21 @@ def main_loop():
             send_dmx(dmx_address, 0)
             GPIO.output(control_pin, False)
 
-            while pygame.mixer.music.get_busy():
-                time.sleep(1)
+            # the timeout only keeps KeyboardInterrupt responsive; SDL turns
+            # SIGTERM into a QUIT event, which must end the loop as well
+            while True:
+                check_dmx_thread()
+                event_type = pygame.event.wait(1000).type
+                if event_type == pygame.QUIT:
+                    return
+                if event_type == sound_end_event:
+                    break
 
     except KeyboardInterrupt:
         pass
     finally:
-        GPIO.cleanup()
-        ser.close()
-        pygame.quit()
+        shutdown_hardware()
 
 if __name__ == '__main__':
+    init_hardware()
     main_loop()